@@ -9,8 +9,318 @@ for documentation and tutorials, especially for UI elements and data visualizati
 import os
 import sys
 import argparse
+import logging
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from PIL import Image, ImageOps, ImageEnhance
+from typing import NamedTuple, Optional
+import PIL
+from PIL import Image, ImageFilter, ImageStat, features
+
+# AVIF output needs the optional pillow-avif-plugin (registers itself on import)
+try:
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+# Verbose output goes through logging so disabled messages are never formatted
+log = logging.getLogger("screenshot_standardizer")
+
+# Input files picked up when processing a directory
+IMAGE_EXTENSIONS = frozenset(['.png', '.jpg', '.jpeg', '.gif', '.webp'])
+
+# Styling shared by every processed image
+BACKGROUND_COLOR = "#ffffff"
+BORDER_COLOR = "#e0e0e0"
+BORDER_WIDTH = 2
+
+# Border rings as (width, color), listed from the outside in
+DEFAULT_FRAME = ((BORDER_WIDTH, BORDER_COLOR),)
+VIZ_FRAME = ((1, BORDER_COLOR), (6, BACKGROUND_COLOR), (BORDER_WIDTH, BORDER_COLOR))
+
+# Premultiplied-alpha counterparts used when resizing images with transparency
+_PREMULTIPLIED_MODES = {"RGBA": "RGBa", "LA": "La"}
+
+# Encoder settings for each output format
+SAVE_OPTIONS = {
+    "png": {
+        "compress_level": 6  # zlib's default speed/size trade-off
+    },
+    "jpeg": {
+        "quality": 90,
+        "optimize": True,
+        "progressive": True,
+        "subsampling": 0  # Better quality for text
+    },
+    "webp": {
+        "quality": 82,
+        "method": 4
+    },
+    "avif": {
+        "quality": 70,
+        "speed": 6
+    },
+}
+
+
+class ProcessConfig(NamedTuple):
+    """Per-run settings passed to worker processes (must stay picklable)."""
+    target_width: int
+    output_format: str
+    padding: int
+    viz: bool
+    save_options: dict
+    border_enabled: bool
+    force: bool
+    quantize: bool
+    oxipng: Optional[str]  # Path to oxipng when --optimize-output is active
+
+
+def _configure_logging(level):
+    """Print log messages to stdout, undecorated, alongside the regular output."""
+    logging.basicConfig(level=level, format="%(message)s", stream=sys.stdout)
+
+
+def _pillow_simd_active():
+    """Return True when running on Pillow-SIMD (its releases carry a .postN suffix)."""
+    return "post" in PIL.__version__
+
+
+def _flatten_rgba(img, keep_alpha):
+    """Return RGBA images as-is, or blended onto the background when alpha is dropped."""
+    if keep_alpha:
+        return img
+    # Blend straight onto an RGB background using alpha as the mask,
+    # avoiding an intermediate RGBA composite and a convert pass
+    background = Image.new('RGB', img.size, BACKGROUND_COLOR)
+    background.paste(img, mask=img)
+    return background
+
+
+def _flatten_la(img, keep_alpha):
+    # Grayscale with alpha: expand to RGBA so transparency lands on the background
+    return _flatten_rgba(img.convert('RGBA'), keep_alpha)
+
+
+def _flatten_palette(img, keep_alpha):
+    # Only palette images with a transparent entry need the alpha-aware path
+    if "transparency" in img.info:
+        return _flatten_rgba(img.convert('RGBA'), keep_alpha)
+    return img.convert('RGB')
+
+
+def _to_rgb(img, keep_alpha):
+    return img.convert('RGB')
+
+
+# Mode conversion before resizing, keyed on img.mode (anything else goes through _to_rgb)
+_MODE_HANDLERS = {
+    'RGB': lambda img, keep_alpha: img,
+    'RGBA': _flatten_rgba,
+    'LA': _flatten_la,
+    'P': _flatten_palette,
+}
+
+
+def _resize(img, size):
+    """Lanczos resize, box-reducing to about 3x the target first for large downscales.
+    
+    Pillow resizes alpha images in premultiplied form, but its internal
+    conversion drops reducing_gap, so premultiply here to keep the box
+    pre-reduction for RGBA and LA images too.
+    """
+    premultiplied = _PREMULTIPLIED_MODES.get(img.mode)
+    if premultiplied:
+        resized = img.convert(premultiplied).resize(size, Image.LANCZOS, reducing_gap=3.0)
+        return resized.convert(img.mode)
+    return img.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+
+def _resize_plan(width, height, target_width, padding):
+    """Return (target_height, draft_size) for an input of the given size.
+    
+    draft_size is None unless the image is more than 2x larger than the
+    resize needs.
+    """
+    # Calculate height while maintaining aspect ratio (of the padded image)
+    padded_width = width + padding * 2
+    padded_height = height + padding * 2
+    target_height = int(target_width * padded_height / padded_width)
+    
+    # Keep at least 2x the resolution the final resize needs
+    scale = target_width / padded_width
+    draft_size = None
+    if scale < 0.5:
+        draft_size = (int(width * scale * 2), int(height * scale * 2))
+    return target_height, draft_size
+
+
+def _enhance_viz(img, contrast, sharpness):
+    """Apply contrast and sharpness enhancement in a single 3x3 convolution.
+    
+    Matches ImageEnhance.Contrast followed by ImageEnhance.Sharpness to within
+    a few levels of rounding. Sharpness blends with Pillow's SMOOTH kernel (centre 5, others 1,
+    /13); since that kernel sums to 1, the contrast stretch around the mean
+    grey folds into the kernel weights and offset.
+    """
+    mean = int(ImageStat.Stat(img.convert("L")).mean[0] + 0.5)
+    side = -(sharpness - 1) / 13 * contrast
+    centre = (sharpness - (sharpness - 1) * 5 / 13) * contrast
+    kernel = ImageFilter.Kernel(
+        (3, 3),
+        [side] * 4 + [centre] + [side] * 4,
+        scale=1,
+        offset=(1 - contrast) * mean
+    )
+    
+    enhanced = img.filter(kernel)
+    
+    # filter() copies the outermost pixels unchanged. ImageEnhance.Sharpness
+    # leaves them unsharpened too, but they still need the contrast stretch
+    lut = [min(255, max(0, int(mean + contrast * (value - mean)))) for value in range(256)]
+    lut *= len(img.getbands())
+    width, height = img.size
+    edges = ((0, 0, width, 1), (0, height - 1, width, height),
+             (0, 1, 1, height - 1), (width - 1, 1, width, height - 1))
+    for box in edges:
+        if box[2] > box[0] and box[3] > box[1]:
+            enhanced.paste(img.crop(box).point(lut), box)
+    
+    # Leave transparency untouched, as ImageEnhance does
+    if img.mode == "RGBA":
+        enhanced.putalpha(img.getchannel("A"))
+    return enhanced
+
+
+def _quantize_method(img):
+    """Pick the best palette quantizer available for this image's mode."""
+    if features.check_feature("libimagequant"):
+        return Image.Quantize.LIBIMAGEQUANT
+    # Median cut only supports RGB; fall back to octree for images with alpha
+    if img.mode == "RGBA":
+        return Image.Quantize.FASTOCTREE
+    return Image.Quantize.MEDIANCUT
+
+
+def _frame(img, rings):
+    """Surround img with concentric border rings using a single canvas allocation.
+    
+    Each ring is filled in place with a box paste, so the image itself is only
+    copied once (instead of once per ring with ImageOps.expand).
+    """
+    frame_width = sum(width for width, _ in rings)
+    framed = Image.new(
+        img.mode,
+        (img.width + frame_width * 2, img.height + frame_width * 2),
+        rings[0][1]
+    )
+    
+    offset = 0
+    for (width, _), (_, color) in zip(rings, rings[1:]):
+        offset += width
+        framed.paste(color, (offset, offset, framed.width - offset, framed.height - offset))
+    
+    framed.paste(img, (frame_width, frame_width))
+    return framed
+
+
+def _process_image(img_path, out_path, cfg):
+    """Process a single image and save it to out_path. Returns True on success."""
+    # Check if file exists and force flag is not set
+    if out_path.exists() and not cfg.force:
+        print(f"Error: File {out_path} already exists. Use --force to overwrite.")
+        return False
+        
+    try:
+        # Open and process image
+        with Image.open(img_path) as img:
+            log.info("Processing %s...", img_path)
+            log.info("Original size: %s, Mode: %s", img.size, img.mode)
+            
+            target_height, draft_size = _resize_plan(
+                img.width, img.height, cfg.target_width, cfg.padding
+            )
+            
+            # For large JPEGs, let libjpeg downscale during decode (DCT scaling)
+            padding = cfg.padding
+            if img.format == 'JPEG' and draft_size:
+                original_width = img.width
+                img.draft(img.mode, draft_size)
+                # Keep padding proportional to the decoded image
+                padding = round(cfg.padding * img.width / original_width)
+                log.info("Decoded JPEG at reduced size: %s", img.size)
+            
+            # Convert to RGB (keeping transparency for PNG output) before padding,
+            # so padding never has to rebuild palette or grayscale images
+            convert = _MODE_HANDLERS.get(img.mode, _to_rgb)
+            img = convert(img, cfg.output_format == 'png')
+            
+            # Add padding if requested
+            if padding > 0:
+                width, height = img.size
+                new_width = width + (padding * 2)
+                new_height = height + (padding * 2)
+                padded_img = Image.new(
+                    img.mode, 
+                    (new_width, new_height), 
+                    BACKGROUND_COLOR
+                )
+                padded_img.paste(img, (padding, padding))
+                img = padded_img
+                log.info("Added %dpx padding. New size: %s", padding, img.size)
+            
+            # Resize image (high quality)
+            img = _resize(img, (cfg.target_width, target_height))
+            log.info("Resized to: %s", img.size)
+            
+            # Apply special processing for data visualizations
+            if cfg.viz:
+                # Enhance contrast and sharpen slightly for better text readability
+                img = _enhance_viz(img, contrast=1.08, sharpness=1.2)
+                log.info("Applied visualization enhancements")
+            
+            # Add border if enabled
+            if cfg.border_enabled:
+                # Visualizations get an extra 6px white gap and 1px outer line
+                img = _frame(img, VIZ_FRAME if cfg.viz else DEFAULT_FRAME)
+                log.info("Added borders. Final size: %s", img.size)
+            
+            # Reduce UI screenshots to an 8-bit palette; viz gradients need full color
+            if cfg.quantize:
+                img = img.quantize(colors=256, method=_quantize_method(img),
+                                   dither=Image.Dither.NONE)
+                log.info("Quantized to a 256-color palette")
+            
+            # Create parent directories if they don't exist
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            
+            # Save the image
+            img.save(out_path, format=cfg.output_format.upper(), **cfg.save_options)
+            
+            # Losslessly recompress the PNG (slow, so only on request)
+            if cfg.oxipng:
+                try:
+                    subprocess.run([cfg.oxipng, "--quiet", "-o", "2", "--strip", "safe", str(out_path)],
+                                   check=True)
+                    log.info("Optimized with oxipng: %d bytes", out_path.stat().st_size)
+                except subprocess.CalledProcessError as e:
+                    # The PNG was already written and is valid, just not optimized
+                    print(f"Warning: oxipng failed on {out_path} (exit code {e.returncode}); "
+                          "keeping the unoptimized file.")
+            
+            print(f"Processed: {img_path.name} → {out_path}")
+            return True
+            
+    except Exception as e:
+        print(f"Error processing {img_path}: {e}")
+        return False
+
+
+def _process_image_star(task):
+    # Unpack (img_path, out_path, cfg) tuples for ProcessPoolExecutor.map
+    return _process_image(*task)
+
 
 def main():
     # Parse command line arguments
@@ -39,6 +349,9 @@ Examples:
   
   # Specify output format
   python screenshot_standardizer.py --input input.png --format jpg
+  
+  # Save as AVIF (requires pillow-avif-plugin)
+  python screenshot_standardizer.py --input input.png --format avif
         """
     )
     
@@ -63,14 +376,30 @@ Examples:
                         help="Disable borders on processed images")
     parser.add_argument("--force", "-f", action="store_true",
                         help="Force overwrite existing files")
-    parser.add_argument("--format", "-fm", choices=["png", "jpg", "jpeg", "webp"],
-                        default="png",
-                        help="Output image format (default: png)")
+    parser.add_argument("--format", "-fm", choices=["png", "jpg", "jpeg", "webp", "avif"],
+                        help="Output image format (default: webp, or taken from --output's extension)")
+    parser.add_argument("--palette", action="store_true",
+                        help="Save PNGs with an adaptive 256-color palette (ignored for --type viz)")
+    parser.add_argument("--optimize-output", action="store_true",
+                        help="Recompress PNG output with oxipng for smaller files (slower)")
+    parser.add_argument("--workers", "-w", type=int, default=os.cpu_count(),
+                        help="Number of images to process in parallel (default: number of CPUs)")
+    parser.add_argument("--executor", choices=["process", "thread"], default="process",
+                        help="Run parallel work in processes or threads (default: process)")
     parser.add_argument("--verbose", "-v", action="store_true",
                         help="Print detailed processing information")
     
     args = parser.parse_args()
     
+    # os.cpu_count() can return None when the CPU count is undetermined
+    if args.workers is None:
+        args.workers = 1
+    elif args.workers < 1:
+        parser.error("--workers must be at least 1")
+    
+    log_level = logging.INFO if args.verbose else logging.WARNING
+    _configure_logging(log_level)
+    
     # Configuration
     sizes = {
         "small": 1024,
@@ -81,15 +410,46 @@ Examples:
     # Get target width
     target_width = sizes.get(args.size, sizes["medium"])
     
+    # Default to the --output file's extension when it names a supported format
+    if args.format is None:
+        suffix = Path(args.output).suffix.lower().lstrip(".") if args.output else ""
+        args.format = suffix if suffix in ("png", "jpg", "jpeg", "webp", "avif") else "webp"
+    
     # Set output format (normalize jpg/jpeg)
     output_format = args.format.lower()
     if output_format == "jpg":
         output_format = "jpeg"
-        
-    border_enabled = not args.no_border
-    background_color = "#ffffff"
-    border_color = "#e0e0e0"
-    border_width = 2
+    
+    # AVIF support depends on the Pillow build or pillow-avif-plugin
+    if output_format == "avif":
+        Image.init()
+        if "AVIF" not in Image.SAVE:
+            print("Error: AVIF output requires pillow-avif-plugin. Install it with: pip install pillow-avif-plugin")
+            sys.exit(1)
+    
+    # PNG post-optimization needs the oxipng binary
+    oxipng = None
+    if args.optimize_output:
+        if output_format != "png":
+            print("Warning: --optimize-output only applies to PNG output and will be ignored.")
+        else:
+            oxipng = shutil.which("oxipng")
+            if oxipng is None:
+                print("Error: --optimize-output requires oxipng. See https://github.com/shssoichiro/oxipng")
+                sys.exit(1)
+    
+    cfg = ProcessConfig(
+        target_width=target_width,
+        output_format=output_format,
+        padding=args.padding,
+        viz=(args.type == "viz"),
+        # Save with proper format and DPI
+        save_options=dict(SAVE_OPTIONS[output_format], dpi=(args.dpi, args.dpi)),
+        border_enabled=not args.no_border,
+        force=args.force,
+        quantize=(args.palette and output_format == "png" and args.type != "viz"),
+        oxipng=oxipng,
+    )
     
     # Properly handle input path - expand user directory (~ notation) and make absolute
     input_path = Path(os.path.expanduser(args.input)).resolve()
@@ -98,112 +458,14 @@ Examples:
     output_dir = Path(os.path.expanduser(args.outdir)).resolve()
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    if args.verbose:
-        print(f"Input path: {input_path}")
-        print(f"Output directory: {output_dir}")
-        print(f"Size preset: {args.size} ({target_width}px width)")
-        print(f"Output format: {args.format}")
-    
-    # Function to process a single image
-    def process_image(img_path, out_path):
-        # Check if file exists and force flag is not set
-        if out_path.exists() and not args.force:
-            print(f"Error: File {out_path} already exists. Use --force to overwrite.")
-            return False
-            
-        try:
-            # Open and process image
-            with Image.open(img_path) as img:
-                if args.verbose:
-                    print(f"Processing {img_path}...")
-                    print(f"Original size: {img.size}, Mode: {img.mode}")
-                
-                # Add padding if requested
-                if args.padding > 0:
-                    width, height = img.size
-                    new_width = width + (args.padding * 2)
-                    new_height = height + (args.padding * 2)
-                    padded_img = Image.new(
-                        img.mode, 
-                        (new_width, new_height), 
-                        background_color
-                    )
-                    padded_img.paste(img, (args.padding, args.padding))
-                    img = padded_img
-                    if args.verbose:
-                        print(f"Added {args.padding}px padding. New size: {img.size}")
-                
-                # Calculate height while maintaining aspect ratio
-                aspect_ratio = img.height / img.width
-                target_height = int(target_width * aspect_ratio)
-                
-                # Convert to RGB if needed
-                if img.mode == 'RGBA' and output_format != 'png':
-                    background = Image.new('RGBA', img.size, background_color)
-                    img = Image.alpha_composite(background, img).convert('RGB')
-                elif img.mode != 'RGB' and img.mode != 'RGBA':
-                    img = img.convert('RGB')
-                
-                # Resize image (high quality)
-                img = img.resize((target_width, target_height), Image.LANCZOS)
-                if args.verbose:
-                    print(f"Resized to: {img.size}")
-                
-                # Apply special processing for data visualizations
-                if args.type == "viz":
-                    # Enhance contrast for better readability
-                    img = ImageEnhance.Contrast(img).enhance(1.08)
-                    
-                    # Sharpen slightly for better text readability
-                    img = ImageEnhance.Sharpness(img).enhance(1.2)
-                    if args.verbose:
-                        print("Applied visualization enhancements")
-                
-                # Add border if enabled
-                if border_enabled:
-                    img = ImageOps.expand(img, border=border_width, fill=border_color)
-                    
-                    # Add extra styling for visualizations
-                    if args.type == "viz":
-                        img = ImageOps.expand(img, border=6, fill="#ffffff")
-                        img = ImageOps.expand(img, border=1, fill="#e0e0e0")
-                    if args.verbose:
-                        print(f"Added borders. Final size: {img.size}")
-                
-                # Set save options based on format
-                save_options = {}
-                if output_format == "png":
-                    save_options = {
-                        "optimize": True,
-                        "compress_level": 1  # Lower compression for better quality
-                    }
-                elif output_format == "jpeg":
-                    save_options = {
-                        "quality": 95,
-                        "optimize": True,
-                        "subsampling": 0  # Better quality for text
-                    }
-                elif output_format == "webp":
-                    save_options = {
-                        "quality": 90,
-                        "lossless": False
-                    }
-                    
-                # Save with proper format and DPI
-                dpi = (args.dpi, args.dpi)
-                
-                # Create parent directories if they don't exist
-                out_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                # Save the image
-                img.save(out_path, format=output_format.upper(), dpi=dpi, **save_options)
-                
-                print(f"Processed: {img_path.name} → {out_path}")
-                return True
-                
-        except Exception as e:
-            print(f"Error processing {img_path}: {e}")
-            return False
+    log.info("Input path: %s", input_path)
+    log.info("Output directory: %s", output_dir)
+    log.info("Size preset: %s (%dpx width)", args.size, target_width)
+    log.info("Output format: %s", args.format)
+    if _pillow_simd_active():
+        log.info("Pillow-SIMD: %s", PIL.__version__)
+    else:
+        log.info("Pillow: %s (install pillow-simd for faster resizing)", PIL.__version__)
     
     # Process directory or single file
     if input_path.is_dir():
@@ -214,40 +476,80 @@ Examples:
             sys.exit(1)
             
         # Get all image files
-        image_extensions = ['.png', '.jpg', '.jpeg', '.gif', '.webp']
-        files = [f for f in input_path.iterdir() 
-                if f.is_file() and f.suffix.lower() in image_extensions]
+        # (scandir entries carry the file type, so no extra stat() per file)
+        with os.scandir(input_path) as entries:
+            files = [Path(entry.path) for entry in entries
+                     if os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS
+                     and entry.is_file()]
         
-        if args.verbose:
-            print(f"Found {len(files)} image files in {input_path}")
+        log.info("Found %d image files in %s", len(files), input_path)
         
         if not files:
             print(f"No image files found in directory: {input_path}")
             sys.exit(1)
         
-        # Process each file
-        processed_count = 0
-        skipped_count = 0
-        
-        for file in files:
+        # Build one task per file, leaving out outputs that already exist so
+        # they are never shipped to a worker. Inputs sharing a stem (a.png, a.jpg)
+        # map to the same output, so only the first one claims it; otherwise two
+        # workers could write the same file at once
+        tasks = []
+        existing = []
+        duplicates = []
+        claimed = {}
+        for file in sorted(files):
             # Use format extension instead of original extension
             extension = "." + args.format.lower()  # Use original format string to maintain .jpg
             
             output_name = f"{file.stem}_{args.size}{extension}"
             output_path = output_dir / output_name
             
-            if args.verbose:
-                print(f"\nProcessing file: {file}")
-                print(f"Output path: {output_path}")
+            if output_path in claimed:
+                duplicates.append((file, claimed[output_path]))
+                continue
+            claimed[output_path] = file
+            
+            if not args.force and output_path.exists():
+                existing.append(output_path)
+                continue
             
-            if process_image(file, output_path):
-                processed_count += 1
-            else:
-                skipped_count += 1
+            log.info("\nProcessing file: %s", file)
+            log.info("Output path: %s", output_path)
+            
+            tasks.append((file, output_path, cfg))
+        
+        if existing:
+            print(f"{len(existing)} output files already exist and will be skipped.")
+            for output_path in existing:
+                log.info("  %s", output_path)
+        
+        for file, owner in duplicates:
+            print(f"Skipped {file.name}: same output name as {owner.name}.")
+        
+        # Images are independent and CPU-bound, so spread them across cores
+        if len(tasks) <= 1 or args.workers == 1:
+            results = [_process_image_star(task) for task in tasks]
+        elif args.executor == "thread":
+            # Pillow releases the GIL in its C code (decode, resize, encode), so
+            # threads run in parallel without process startup or pickling costs
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                results = list(executor.map(_process_image_star, tasks))
+        else:
+            # Workers configure their own logging in case they were spawned, not forked
+            with ProcessPoolExecutor(max_workers=args.workers,
+                                     initializer=_configure_logging,
+                                     initargs=(log_level,)) as executor:
+                results = list(executor.map(_process_image_star, tasks, chunksize=4))
+        
+        processed_count = sum(1 for ok in results if ok)
+        failed_count = len(results) - processed_count
                 
         print(f"\nSummary: Processed {processed_count} of {len(files)} images")
-        if skipped_count > 0:
-            print(f"Skipped {skipped_count} files. Use --force to overwrite existing files.")
+        if existing:
+            print(f"Skipped {len(existing)} files. Use --force to overwrite existing files.")
+        if duplicates:
+            print(f"Skipped {len(duplicates)} files whose output name was already taken.")
+        if failed_count > 0:
+            print(f"Failed to process {failed_count} files.")
         
     else:
         # Process single file
@@ -261,11 +563,10 @@ Examples:
             output_name = f"{input_path.stem}_processed{extension}"
             output_path = output_dir / output_name
             
-        if args.verbose:
-            print(f"\nProcessing single file: {input_path}")
-            print(f"Output path: {output_path}")
+        log.info("\nProcessing single file: %s", input_path)
+        log.info("Output path: %s", output_path)
             
-        if not process_image(input_path, output_path):
+        if not _process_image(input_path, output_path, cfg):
             sys.exit(1)
 
 if __name__ == "__main__":